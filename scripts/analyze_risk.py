@@ -6,22 +6,64 @@ Usage:
   python .\scripts\analyze_risk.py --input data/vendor_register_template.xlsx --outdir outputs --days 365
 """
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import argparse
-import os
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from openpyxl import load_workbook
-from openpyxl.styles import PatternFill
 
 LOG = logging.getLogger(__name__)
 
+RISK_CATEGORIES = ['Low', 'Medium', 'High', 'Unknown']
+# flat-colour charts compress nearly as well at level 3 and encode much faster than the default 6
+PNG_KWARGS = {'compress_level': 3}
+
+def read_excel_fast(p):
+    # calamine (Rust) is much faster than openpyxl; needs pandas >= 2.2 and python-calamine
+    try:
+        return pd.read_excel(p, engine='calamine')
+    except (ImportError, ValueError) as exc:
+        LOG.debug("calamine unavailable (%s); falling back to openpyxl", exc)
+    # pandas already opens the workbook with read_only=True, data_only=True
+    return pd.read_excel(p, engine='openpyxl')
+
+def cached_load(path):
+    # parsed workbook is cached beside the source as <name>.cache.parquet, keyed by the xlsx mtime and size
+    path = Path(path)
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return read_excel_fast(path)
+    cache = path.with_name(path.name + '.cache.parquet')
+    st = path.stat()
+    key = {b'source_mtime_ns': str(st.st_mtime_ns).encode(), b'source_size': str(st.st_size).encode()}
+    if cache.exists():
+        try:
+            meta = pq.read_schema(cache).metadata or {}
+        except (pa.ArrowException, OSError) as exc:
+            meta = {}
+            LOG.warning("Ignoring unreadable cache %s: %s", cache, exc)
+        if not all(k in meta for k in key):
+            # not one of ours; never overwrite a file this loader didn't create
+            LOG.warning("%s exists but is not a register cache; not caching", cache)
+            return read_excel_fast(path)
+        if all(meta[k] == v for k, v in key.items()):
+            return pd.read_parquet(cache)
+    df = read_excel_fast(path)
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_table(table.replace_schema_metadata({**(table.schema.metadata or {}), **key}), cache)
+    except (pa.ArrowException, OSError) as exc:  # e.g. mixed-type columns arrow can't store
+        LOG.warning("Could not write cache %s: %s", cache, exc)
+    return df
+
 def load_input(preferred):
     for p in preferred:
         if p.exists():
             LOG.info("Loading %s", p)
             if p.suffix.lower() in ('.xls', '.xlsx'):
-                df = pd.read_excel(p, engine='openpyxl')
+                df = cached_load(p)
             else:
                 df = pd.read_csv(p)
             return df, p
@@ -35,118 +77,185 @@ def ensure_columns(df):
         if col not in df.columns:
             LOG.warning("Column missing: %s - creating empty column", col)
             df[col] = pd.NA
+    # few distinct statuses; counting category codes is cheaper than hashing strings
+    df['Remediation Status'] = df['Remediation Status'].astype('category')
     return df
 
+def sniff_date_format(values):
+    # pick an explicit format so to_datetime stays on the C parser;
+    # slash dates are month-first (as pandas parses them) unless some day > 12 says otherwise
+    parts = pd.Series(values, dtype='string').str.extract(r'^\s*(\d{1,2})/(\d{1,2})/\d{4}').dropna()
+    if parts.empty:
+        return 'ISO8601'
+    if (parts[0].astype(int) > 12).any():
+        return '%d/%m/%Y'
+    return '%m/%d/%Y'
+
+def to_datetime_checked(values, fmt):
+    parsed = pd.to_datetime(values, format=fmt, errors='coerce')
+    if parsed.isna().sum() > pd.isna(values).sum():
+        # some values don't fit the sniffed format; parse each one individually
+        parsed = pd.to_datetime(values, format='mixed', errors='coerce')
+    return parsed
+
+def parse_dates(s):
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s
+    # registers repeat the same review dates, so parse each distinct value once
+    s = s.astype('string')
+    uniq = s.dropna().unique()
+    fmt = sniff_date_format(uniq)
+    if len(uniq) == 0 or len(uniq) > 0.8 * len(s):
+        return to_datetime_checked(s, fmt)
+    parsed = pd.Series(to_datetime_checked(pd.Index(uniq), fmt), index=uniq)
+    return s.map(parsed)
+
 def compute_flags(df, days_threshold, high_threshold):
     today = pd.Timestamp.today().normalize()
     threshold = today - pd.Timedelta(days=days_threshold)
 
     # parse dates & numeric
-    df['Assessment Date'] = pd.to_datetime(df['Assessment Date'], errors='coerce')
+    df['Assessment Date'] = parse_dates(df['Assessment Date'])
     df['Risk Score'] = pd.to_numeric(df['Risk Score'], errors='coerce')
+    # whole-number scores fit in Int16, which keeps the scans below cheap; anything else stays float64
+    scores = df['Risk Score'].dropna()
+    if (scores == scores.round()).all() and scores.between(-32768, 32767).all():
+        df['Risk Score'] = df['Risk Score'].astype('Int16')
+
+    # work on the raw int64 ticks; NaT is INT64_MIN so it sorts below every real date
+    dates = df['Assessment Date'].to_numpy()
+    unit = np.datetime_data(dates.dtype)[0]
+    ticks = dates.view('i8')
+    nat = ticks == np.iinfo(np.int64).min
 
     # days since review
-    df['Days Since Review'] = (today - df['Assessment Date']).dt.days
-
-    # needs review = missing OR older than threshold
-    df['Needs Review'] = df['Assessment Date'].isna() | (df['Assessment Date'] < threshold)
-
-    # risk category buckets
-    def bucket(score):
-        if pd.isna(score):
-            return 'Unknown'
-        if score >= high_threshold:
-            return 'High'
-        if score >= 50:
-            return 'Medium'
-        return 'Low'
-    df['Risk Category'] = df['Risk Score'].apply(bucket)
-    return df
+    ticks_per_day = np.timedelta64(1, 'D').astype(f'm8[{unit}]').view('i8')
+    days = (today.to_datetime64().astype(f'M8[{unit}]').view('i8') - ticks) // ticks_per_day
+    df['Days Since Review'] = np.where(nat, np.nan, days) if nat.any() else days
+
+    # needs review = missing OR older than threshold, in a single compare
+    df['Needs Review'] = ticks < threshold.to_datetime64().astype(f'M8[{unit}]').view('i8')
 
-def save_outputs(df, outdir, high_threshold):
-    # 1. Save high risk CSV
-    high_path = os.path.join(outdir, "high_risk.csv")
-    df.loc[df['Risk Score'] >= high_threshold].to_csv(high_path, index=False)
+    # risk category buckets: [-inf, 50) Low, [50, high) Medium, [high, inf) High
+    if high_threshold > 50:
+        bins, labels = [-np.inf, 50, high_threshold, np.inf], ['Low', 'Medium', 'High']
+    else:
+        bins, labels = [-np.inf, high_threshold, np.inf], ['Low', 'High']
+    category = pd.cut(df['Risk Score'], bins=bins, labels=labels, right=False)
+    df['Risk Category'] = category.cat.set_categories(RISK_CATEGORIES).fillna('Unknown')
+
+    # computed once here so save_outputs/main don't rescan the columns
+    high_mask = (df['Risk Score'] >= high_threshold).to_numpy(dtype=bool, na_value=False)
+    needs_mask = df['Needs Review'].to_numpy()
+    return df, high_mask, needs_mask
 
-    # 2. Save needs review CSV
-    needs_path = os.path.join(outdir, "needs_review.csv")
-    df.loc[df['Needs Review']].to_csv(needs_path, index=False)
+def write_csv(df, path):
+    # one large buffer keeps the number of write syscalls down on big outputs
+    with open(path, 'wb', buffering=1 << 20) as f:
+        df.to_csv(f, index=False, lineterminator='\n')
+
+def save_outputs(df, outdir, high_mask, needs_mask):
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
 
-    # 3. Save Excel with highlights
-    excel_path = os.path.join(outdir, "vendor_register_flagged.xlsx")
-    # (code that writes Excel goes here)
+    high_path = outdir / "high_risk.csv"
+    needs_path = outdir / "needs_review.csv"
+    excel_path = outdir / "vendor_register_flagged.xlsx"
+
+    # the three writes are independent; overlap the CSV flushes with the xlsx serialisation
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [
+            # 1. Save high risk CSV
+            pool.submit(write_csv, df.loc[high_mask], high_path),
+            # 2. Save needs review CSV
+            pool.submit(write_csv, df.loc[needs_mask], needs_path),
+            # 3. Save Excel with highlights
+            pool.submit(write_excel, df, excel_path, needs_mask),
+        ]
+        for future in futures:
+            future.result()
 
     print(f"[INFO] Saved CSVs and Excel: {high_path}, {needs_path}, {excel_path}")
 
     # ✅ Add this at the very end:
     return high_path, needs_path, excel_path
 
-def highlight_excel(excel_path: Path, fill_hex='FFF2CC'):
-    # light yellow default
-    wb = load_workbook(excel_path)
-    if 'Vendor Register' not in wb.sheetnames:
-        LOG.warning("Vendor Register sheet not found for highlighting")
-        return
-    ws = wb['Vendor Register']
-    headers = [cell.value for cell in ws[1]]
-    try:
-        flag_col = headers.index('Needs Review') + 1
-    except ValueError:
-        LOG.warning("'Needs Review' column not found in Excel; skipping highlight")
-        wb.save(excel_path)
-        return
+def write_excel(df, excel_path, needs_mask, fill_hex='FFFFF2CC'):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill
 
+    # stream rows in write-only mode; the fill is set on each cell as it is emitted
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Vendor Register')
+
+    # light yellow default
     fill = PatternFill(start_color=fill_hex, end_color=fill_hex, fill_type='solid')
+    bold = Font(bold=True)
+
+    header = []
+    for name in df.columns:
+        cell = WriteOnlyCell(ws, value=str(name))
+        cell.font = bold
+        header.append(cell)
+    ws.append(header)
 
-    for r in range(2, ws.max_row + 1):
-        cell = ws.cell(row=r, column=flag_col)
-        val = cell.value
-        # handle True/False, strings, 1/0
-        flagged = False
-        if val is True:
-            flagged = True
-        elif isinstance(val, str) and val.strip().lower() in ('true', '1', 'yes'):
-            flagged = True
-        elif isinstance(val, (int, float)) and val == 1:
-            flagged = True
+    values = df.astype(object).where(df.notna(), None)
+    for flagged, values_row in zip(needs_mask, values.itertuples(index=False, name=None)):
+        row = [WriteOnlyCell(ws, value=v) for v in values_row]
         if flagged:
-            for c in range(1, ws.max_column + 1):
-                ws.cell(row=r, column=c).fill = fill
+            for cell in row:
+                cell.fill = fill
+        ws.append(row)
 
     wb.save(excel_path)
     LOG.info("Applied highlights to flagged rows in %s", excel_path)
 
 def make_charts(df, outdir: Path):
+    # imported here so runs without charts don't pay for matplotlib start-up
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
     outdir.mkdir(parents=True, exist_ok=True)
 
+    # one figure is reused for both charts
+    fig, ax = plt.subplots(figsize=(8,4))
+
     # Top 5 high risk bar chart
-    top5 = df.sort_values('Risk Score', ascending=False).head(5)
+    top5 = df.nlargest(5, 'Risk Score')
     if not top5.empty:
-        ax = top5.plot.bar(x='Vendor Name', y='Risk Score', legend=False, title='Top 5 High Risk Vendors', figsize=(8,4))
+        top5.plot.bar(x='Vendor Name', y='Risk Score', legend=False, title='Top 5 High Risk Vendors', ax=ax)
         ax.set_ylabel('Risk Score')
-        plt.tight_layout()
+        fig.tight_layout()
         top5_path = outdir / 'top5_high_risk.png'
-        plt.savefig(top5_path)
-        plt.close()
+        fig.savefig(top5_path, pil_kwargs=PNG_KWARGS)
         LOG.info("Saved top5 chart: %s", top5_path)
 
     # Remediation status pie chart
-    status_counts = df['Remediation Status'].fillna('Unknown').value_counts()
+    status = df['Remediation Status']
+    if 'Unknown' not in status.cat.categories:
+        status = status.cat.add_categories(['Unknown'])
+    status_counts = status.fillna('Unknown').value_counts()
+    status_counts = status_counts[status_counts > 0]
     if not status_counts.empty:
-        fig, ax = plt.subplots(figsize=(6,6))
+        ax.clear()
+        fig.set_size_inches(6, 6)
         status_counts.plot.pie(autopct='%1.0f%%', ylabel='', title='Remediation Status Distribution', ax=ax)
-        plt.tight_layout()
+        fig.tight_layout()
         pie_path = outdir / 'remediation_status_pie.png'
-        plt.savefig(pie_path)
-        plt.close()
+        fig.savefig(pie_path, pil_kwargs=PNG_KWARGS)
         LOG.info("Saved remediation status pie: %s", pie_path)
 
+    plt.close(fig)
+
 def main():
     parser = argparse.ArgumentParser(description="Vendor register analysis + flagging")
     parser.add_argument('--input', '-i', help='Input file (xlsx or csv)', default=None)
     parser.add_argument('--outdir', '-o', help='Output dir', default='outputs')
     parser.add_argument('--days', '-d', type=int, help='Days threshold for Needs Review', default=365)
     parser.add_argument('--threshold', '-t', type=int, help='High risk threshold (default=80)', default=80)
+    parser.add_argument('--no-charts', action='store_true', help='Skip the PNG charts')
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
@@ -159,18 +268,19 @@ def main():
 
     df, src = load_input(paths)
     df = ensure_columns(df)
-    df = compute_flags(df, args.days, args.threshold)
+    df, high_mask, needs_mask = compute_flags(df, args.days, args.threshold)
 
     # console summary
     LOG.info("Rows total: %d", len(df))
-    LOG.info("High risk (>=80): %d", int((df['Risk Score'] >= 80).sum()))
-    LOG.info("Needs review: %d", int(df['Needs Review'].sum()))
-    LOG.info("Risk categories:\n%s", df['Risk Category'].value_counts(dropna=False).to_string())
+    LOG.info("High risk (>=%d): %d", args.threshold, int(high_mask.sum()))
+    LOG.info("Needs review: %d", int(needs_mask.sum()))
+    category_counts = df['Risk Category'].value_counts(dropna=False)
+    LOG.info("Risk categories:\n%s", category_counts[category_counts > 0].to_string())
 
     outdir = Path(args.outdir)
-    high_path, needs_path, excel_path = save_outputs(df, outdir, args.threshold)
-    highlight_excel(excel_path)
-    make_charts(df, outdir)
+    high_path, needs_path, excel_path = save_outputs(df, outdir, high_mask, needs_mask)
+    if not args.no_charts:
+        make_charts(df, outdir)
 
     LOG.info("Done. Outputs are in: %s", outdir.resolve())
 
@@ -3,12 +3,16 @@ from pathlib import Path
 import sys
 import pandas as pd
 
+# analyze_risk sits next to this file; make that importable however the script is run
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from analyze_risk import cached_load, parse_dates
+
 def load_register():
     excel_path = Path("data/vendor_register_template.xlsx")
     csv_path = Path("data/vendor_register_template.csv")
 
     if excel_path.exists():
-        df = pd.read_excel(excel_path)
+        df = cached_load(excel_path)
         source = excel_path
     elif csv_path.exists():
         df = pd.read_csv(csv_path)
@@ -32,7 +36,7 @@ def main():
 
     # 3) Parse 'Assessment Date' to datetime
     if "Assessment Date" in df.columns:
-        df["Assessment Date"] = pd.to_datetime(df["Assessment Date"], errors="coerce")
+        df["Assessment Date"] = parse_dates(df["Assessment Date"])
 
     print("\n▶ Data types AFTER:")
     print(df.dtypes)